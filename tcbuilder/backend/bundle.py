@@ -5,25 +5,37 @@
 import logging
 import os
 import re
+import shlex
 import shutil
 import subprocess
 import sys
 import time
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import docker
 import docker.errors
 import docker.types
+import docker.utils
 import yaml
 
+from requests.exceptions import RequestException
+
 from tcbuilder.errors import (InvalidArgumentError, OperationFailureError,
                               InvalidStorageDriverError)
-from tcbuilder.backend.common import get_own_network, validate_compose_file
+from tcbuilder.backend.common import (get_host_docker_client, get_own_image,
+                                      get_own_network, validate_compose_file)
 from tcbuilder.backend.registryops import RegistryOperations
 
 log = logging.getLogger("torizon." + __name__)
 
+# DOCKER_HOST (TCP) regex pre-compiled; the host may be a bracketed IPv6 address.
+DOCKER_HOST_REGEX = re.compile(r"^tcp://(\[[^\]]+\]|[^:/]+):(\d+)")
+
+# Maximum number of container images fetched at the same time.
+MAX_PARALLEL_PULLS = 8
+
 
 def get_compression_command(output_file):
     """Get compression command
@@ -32,32 +44,41 @@ def get_compression_command(output_file):
         output_filename: File name or path with compression extension
 
     Returns:
-        (str, str): output_file without compression ending, compression command
+        (str, list): output_file without compression ending, command compressing
+                     its standard input into its standard output
         (str, None): if output_file doesn't end with any of the compression formats below
     """
     command = None
     output_file_tar = output_file
     if output_file.endswith(".xz"):
         output_file_tar = output_file[:-3]
-        command = ["xz", "-3", "-z", output_file_tar]
+        command = ["xz", "-T0", "-3", "-z", "-c"]
     elif output_file.endswith(".gz"):
         output_file_tar = output_file[:-3]
-        command = ["gzip", output_file_tar]
+        command = ["pigz", "-c"]
     elif output_file.endswith(".lzo"):
         output_file_tar = output_file[:-4]
-        command = ["lzop", "-U", "-o", output_file, output_file_tar]
+        command = ["lzop", "-c"]
     elif output_file.endswith(".lz4"):
         output_file_tar = output_file[:-4]
-        command = ["lz4", "-1", "-z", output_file, output_file_tar]
+        command = ["lz4", "-1", "-z", "-c"]
     elif output_file.endswith(".zst"):
         output_file_tar = output_file[:-4]
-        command = ["zstd", "--rm", output_file_tar, "-o", output_file]
+        command = ["zstd", "-T0", "-3", "-c"]
     elif not output_file.endswith(".tar"):
         output_file_tar = f"{output_file}.tar"
 
     return (output_file_tar, command)
 
 
+def remove_partial_output(output_filepath):
+    """Remove a (possibly missing) output file left by a failed archiving"""
+    try:
+        os.remove(output_filepath)
+    except FileNotFoundError:
+        pass
+
+
 # pylint: disable=no-self-use
 class DockerManager:
     """Docker bundling helper class
@@ -67,8 +88,7 @@ class DockerManager:
     already preinstalled.
     """
     def __init__(self, output_dir):
-        if not os.path.isdir(output_dir):
-            os.mkdir(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
         self.output_dir = output_dir
         self.output_dir_host = output_dir
 
@@ -78,37 +98,75 @@ class DockerManager:
     def stop(self):
         """Stop manager (dummy implementation)"""
 
-    def get_tar_command(self, output_file):
+    def get_tar_command(self, output_file, preserve_atime=False):
         """Create the tar command to archive the Docker images"""
-        return [
+        command = [
             "tar", "--numeric-owner",
             "--preserve-permissions", "--directory=/var/lib/docker",
             "--xattrs-include='*'", "--create", "--file", output_file,
             "overlay2/", "image/"
         ]
+        if preserve_atime:
+            # Read files with O_NOATIME so that archiving the (big) Docker
+            # storage does not dirty the inode of every file it reads. O_NOATIME
+            # fails with EPERM unless the reader owns the file or has
+            # CAP_FOWNER, so only DockerManager, which reads the host storage as
+            # root, asks for it; DindManager reads through a read-only mount.
+            command.insert(2, "--atime-preserve=system")
+        return command
 
     def get_client(self):
         """Create an instance of the Docker client"""
-        return docker.from_env()
+        return get_host_docker_client()
 
     def save_tar(self, output_file):
         """Create compressed tar archive of the Docker images"""
 
         output_file_tar, compression_command = get_compression_command(output_file)
 
-        # Use host tar to store the Docker storage backend
-        subprocess.run(
-            self.get_tar_command(os.path.join(self.output_dir, output_file_tar)),
-            check=True)
+        if compression_command is None:
+            log.debug(f"Not compressing {output_file_tar}")
+            # Use host tar to store the Docker storage backend
+            subprocess.run(
+                self.get_tar_command(os.path.join(self.output_dir, output_file_tar),
+                                     preserve_atime=True),
+                check=True)
+            return
+
+        log.debug(f"compression_command: {compression_command}")
 
+        # Stream the output of tar directly into the compressor so that no
+        # intermediate (uncompressed) tarball is written to disk.
         output_filepath = os.path.join(self.output_dir, output_file)
-        if os.path.exists(output_filepath):
-            os.remove(output_filepath)
-
-        if compression_command is not None:
-            subprocess.run(compression_command, cwd=self.output_dir, check=True)
-        else:
-            log.debug(f"Not compressing {output_file_tar}")
+        succeeded = False
+        try:
+            with open(output_filepath, "wb") as output_fd:
+                tar_proc = subprocess.Popen(  # pylint: disable=consider-using-with
+                    self.get_tar_command("-", preserve_atime=True),
+                    stdout=subprocess.PIPE)
+                compress_status = None
+                try:
+                    compress_proc = subprocess.Popen(  # pylint: disable=consider-using-with
+                        compression_command, stdin=tar_proc.stdout, stdout=output_fd)
+                    # Allow tar to receive a SIGPIPE if the compressor exits early.
+                    tar_proc.stdout.close()
+                    compress_status = compress_proc.wait()
+                finally:
+                    if compress_status is None:
+                        # The compressor could not run: do not leave tar behind.
+                        tar_proc.stdout.close()
+                        tar_proc.kill()
+                    tar_status = tar_proc.wait()
+
+            if tar_status != 0 or compress_status != 0:
+                raise OperationFailureError(
+                    f"Could not create output tarball in '{output_file}' "
+                    f"(tar status: {tar_status}, compressor status: {compress_status}).")
+            succeeded = True
+        finally:
+            if not succeeded:
+                # Do not leave a truncated bundle behind.
+                remove_partial_output(output_filepath)
 
     def add_cacerts(self, cacerts):
         assert cacerts is None, "`cacerts` should be used with DindManager"
@@ -132,6 +190,11 @@ class DindManager(DockerManager):
     DIND_VOLUME_NAME = "dind-volume"
     DIND_CONTAINER_NAME = "tcb-fetch-dind"
     TAR_CONTAINER_NAME = "tcb-build-tar"
+    # Time (in seconds) to wait for the DinD certificates and daemon.
+    DIND_READY_TIMEOUT = 30
+    # Time (in seconds) to wait for the tar container: it archives and compresses
+    # the whole Docker storage, which can take long for multi-GB bundles.
+    TAR_CONTAINER_TIMEOUT = 3600
 
     def __init__(self, output_dir, host_workdir):
         super(DindManager, self).__init__(output_dir)
@@ -139,7 +202,7 @@ class DindManager(DockerManager):
         # Create certificate directory based on date/time.
         cert_dir_rel = datetime.now().strftime("certs_%Y%m%d%H%M%S_%f.tmp")
         cert_dir = os.path.join(os.getcwd(), cert_dir_rel)
-        os.mkdir(cert_dir)
+        os.makedirs(cert_dir, exist_ok=True)
 
         # Certificates and output directory as accessible from our container.
         self.cert_dir = cert_dir
@@ -161,7 +224,7 @@ class DindManager(DockerManager):
         else:
             assert False, f"Bad argument type, host_workdir={host_workdir}"
 
-        self.host_client = docker.from_env()
+        self.host_client = get_host_docker_client()
 
         storage_driver = self.host_client.info()["Driver"]
         if storage_driver != "overlay2":
@@ -185,17 +248,19 @@ class DindManager(DockerManager):
             os.path.join(self.cert_dir, 'client', 'key.pem')
         ]
 
+        # Certificates are usually generated within a fraction of a second so
+        # poll for them frequently.
         success = False
-        for _retry in range(30):
-            time.sleep(1)
+        deadline = time.monotonic() + self.DIND_READY_TIMEOUT
+        while time.monotonic() < deadline:
             if all(os.path.exists(file) for file in needed_files):
                 success = True
                 break
+            time.sleep(0.05)
 
         # The simple presence of the files does not ensure the other process has
-        # finished writing them: add some time here as an imperfect safeguard.
-        time.sleep(1)
-
+        # finished writing them: this is handled by _connect_daemon() which retries
+        # until a connection (using those files) succeeds.
         if not success:
             raise OperationFailureError(
                 "The script could not access the TLS certificates which have "
@@ -203,6 +268,26 @@ class DindManager(DockerManager):
                 f"{self.cert_dir} is a shared location between this script and "
                 "the Docker host.")
 
+    def _connect_daemon(self, tls_config):
+        # Wait until the Docker daemon in the DinD instance answers requests;
+        # notice the client constructor itself already queries the daemon (for
+        # its API version) so it has to be retried as well.
+        deadline = time.monotonic() + self.DIND_READY_TIMEOUT
+        while True:
+            client = None
+            try:
+                client = docker.DockerClient(base_url=self.docker_host, tls=tls_config)
+                client.ping()
+                return client
+            except (docker.errors.DockerException, RequestException) as exc:
+                if client is not None:
+                    client.close()
+                if time.monotonic() >= deadline:
+                    raise OperationFailureError(
+                        "The Docker in Docker instance did not become ready at "
+                        f"\"{self.docker_host}\": {str(exc)}") from exc
+            time.sleep(0.2)
+
     def start(self, network_name="fetch-dind-network",
               default_platform=None, dind_params=None, dind_env=None):
         """Start manager
@@ -225,10 +310,12 @@ class DindManager(DockerManager):
                 # In case we use a Docker host, also connect to that host to
                 # reach the DIND instance (Gitlab CI case)
                 docker_host = os.environ["DOCKER_HOST"]
-                results = re.findall(r"tcp?:\/\/(.*):(\d*)\/?.*", docker_host)
-                if not results or len(results) < 1:
-                    raise Exception("Regex does not match: {}".format(docker_host))
-                host_ip = results[0][0]
+                matches = DOCKER_HOST_REGEX.match(docker_host)
+                if not matches:
+                    raise InvalidArgumentError(
+                        "Error: DOCKER_HOST must be in the form tcp://HOST:PORT "
+                        f"(got '{docker_host}').")
+                host_ip = matches.group(1)
                 self.docker_host = f"tcp://{host_ip}:{port}"
             else:
                 self.docker_host = f"tcp://127.0.0.1:{port}"
@@ -361,75 +448,93 @@ class DindManager(DockerManager):
                          os.path.join(self.cert_dir, 'client', 'key.pem')))
 
         log.info(f"Connecting to Docker Daemon at \"{self.docker_host}\"")
-        dind_client = docker.DockerClient(base_url=self.docker_host, tls=tls_config)
-        return dind_client
+        return self._connect_daemon(tls_config)
 
     def save_tar(self, output_file):
         """Create compressed tar archive of the Docker images"""
 
         log.info(f"Storing container bundle into \"{self.bundle_dir}\"")
 
-        # Get tar filename and compression command to convert to compressed tar
-        # locally in a second command (we do not have the compression utils in
-        # the tar container).
+        # Get tar filename and the command to compress the tar stream inside
+        # the tar container.
         (output_file_tar, compression_command) = get_compression_command(output_file)
 
         # Notice that here we mount the DIND volume containing the Docker images
         # as a read-only input so that the compression command will have access
         # to them in order to operate. The bundle directory, in turn, is where
-        # the output will be generated.
+        # the output will be generated. The consistency requirements are relaxed
+        # (write-heavy output, read-only input) which speeds up file sharing on
+        # Docker Desktop; these settings are ignored on Linux hosts.
         _mount_dir = "/mnt"
         _mounts = [
             docker.types.Mount(
                 source=self.bundle_dir_host[0],
                 type=self.bundle_dir_host[1],
                 target=_mount_dir,
-                read_only=False
+                read_only=False,
+                consistency='delegated'
             ),
             docker.types.Mount(
                 source=self.DIND_VOLUME_NAME,
                 type='volume',
                 target='/var/lib/docker/',
-                read_only=True
+                read_only=True,
+                consistency='cached'
             )
         ]
         log.debug(f"Volume mapping for tar container: {_mounts}")
-        _tar_command = self.get_tar_command(
-            os.path.join(_mount_dir, self.bundle_dir, output_file_tar))
+
+        if compression_command is None:
+            log.debug(f"Not compressing {output_file_tar}")
+            output_file_final = output_file_tar
+            _pipeline = shlex.join(self.get_tar_command(
+                os.path.join(_mount_dir, self.bundle_dir, output_file_tar)))
+        else:
+            log.debug(f"compression_command: {compression_command}")
+            output_file_final = output_file
+            # Pipe tar into the compressor so that the uncompressed stream never
+            # hits the disk.
+            _pipeline = (
+                f"{shlex.join(self.get_tar_command('-'))} | "
+                f"{shlex.join(compression_command)} > "
+                f"{shlex.quote(os.path.join(_mount_dir, self.bundle_dir, output_file))}")
+        _tar_command = ["bash", "-c", f"set -o pipefail && {_pipeline}"]
         log.debug(f"tar command: {_tar_command}")
 
-        # Due to issues with WSL, we are running the container detached and
-        # explicitly waiting it to stop.
+        # The tar container runs our own image, which already provides GNU tar
+        # and all the compressors (and is present on the host), so nothing needs
+        # to be pulled or installed. Due to issues with WSL, we are running the
+        # container detached and explicitly waiting it to stop.
         _tar_container = self.host_client.containers.run(
-            "debian:bullseye-slim",
+            get_own_image(),
             name=self.TAR_CONTAINER_NAME,
             mounts=_mounts,
-            command=_tar_command,
+            entrypoint=_tar_command,
+            user="root",
             detach=True)
 
+        output_filepath = os.path.join(self.bundle_dir, output_file_final)
+        succeeded = False
         try:
-            _tar_container.wait(timeout=300)
-        except Exception as exc:
-            _err = OperationFailureError("Tarball generation command timed out.")
-            raise _err from exc
+            try:
+                _tar_result = _tar_container.wait(timeout=self.TAR_CONTAINER_TIMEOUT)
+            except Exception as exc:
+                _err = OperationFailureError(
+                    "Tarball generation command timed out "
+                    f"(after {self.TAR_CONTAINER_TIMEOUT} seconds).")
+                raise _err from exc
+            finally:
+                _tar_container.stop()
+                _tar_container.remove()
+
+            if _tar_result.get("StatusCode") != 0 or not os.path.exists(output_filepath):
+                raise OperationFailureError(
+                    f"Could not create output tarball in '{output_file_final}'.")
+            succeeded = True
         finally:
-            _tar_container.stop()
-            _tar_container.remove()
-
-        output_filepath_tar = os.path.join(self.bundle_dir, output_file_tar)
-        if not os.path.exists(output_filepath_tar):
-            raise OperationFailureError(
-                f"Could not create output tarball in '{output_file_tar}'.")
-
-        if compression_command is not None:
-            log.debug(f"compression_command: {compression_command}")
-
-            output_filepath = os.path.join(self.bundle_dir, output_file)
-            if os.path.exists(output_filepath):
-                os.remove(output_filepath)
-            subprocess.run(compression_command, cwd=self.bundle_dir, check=True)
-        else:
-            log.debug(f"Not compressing {output_file_tar}")
+            if not succeeded:
+                # Do not leave a truncated bundle behind.
+                remove_partial_output(output_filepath)
 
 
     def add_cacerts(self, cacerts):
@@ -511,6 +616,85 @@ def show_pull_progress_xterm(pull_stream):
         # print(res)
 
 
+def pull_image(client, image_name, platform=None, show_progress=False):
+    """Pull a container image and get its digest reference
+
+    The digest is taken from the (low-level) pull progress stream so that
+    no further request is needed to inspect the image after pulling it.
+
+    :param client: A DockerClient object to use on the operations.
+    :param image_name: Name of the image to pull (including the tag).
+    :param platform: Container Platform to fetch (if an image is multi-arch
+                     capable)
+    :param show_progress: Whether or not to show the pulling progress (needs
+                          an xterm compatible terminal).
+    :return: Reference to the image in the form REPOSITORY@DIGEST.
+    """
+
+    repository, _tag = docker.utils.parse_repository_tag(image_name)
+    digest = None
+
+    def watch_stream(pull_stream):
+        nonlocal digest
+        for res in pull_stream:
+            if 'error' in res:
+                raise OperationFailureError(
+                    f"Error: could not fetch container image {image_name}: {res['error']}")
+            status = res.get('status', '')
+            if status.startswith("Digest: "):
+                digest = status[len("Digest: "):]
+            yield res
+
+    pull_stream = watch_stream(
+        client.api.pull(image_name, stream=True, decode=True, platform=platform))
+    if show_progress:
+        show_pull_progress_xterm(pull_stream)
+    else:
+        for _res in pull_stream:
+            pass
+
+    if digest is None:
+        # Should not happen with registries, but fall back to inspection.
+        log.debug(f"No digest in pull stream of {image_name}; inspecting image")
+        return client.images.get(image_name).attrs['RepoDigests'][0]
+
+    return f"{repository}@{digest}"
+
+
+def pull_images(client, images, platform=None, show_progress=False):
+    """Pull the container images of multiple services
+
+    :param client: A DockerClient object to use on the operations.
+    :param images: Dictionary mapping service names to image names.
+    :param platform: Container Platform to fetch (if an image is multi-arch
+                     capable)
+    :param show_progress: Whether or not to show the pulling progress; images
+                          are pulled one at a time when it is shown.
+    :return: Dictionary mapping service names to image references in the
+             form REPOSITORY@DIGEST.
+    """
+
+    if show_progress:
+        image_refs = {}
+        for svc_name, image_name in images.items():
+            log.info(f"Fetching container image {image_name} in service {svc_name}")
+            image_refs[svc_name] = pull_image(
+                client, image_name, platform=platform, show_progress=True)
+        return image_refs
+
+    # Without progress display the images can be fetched in parallel
+    # by the Docker daemon.
+    max_workers = max(1, min(MAX_PARALLEL_PULLS, len(images)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for svc_name, image_name in images.items():
+            log.info(f"Fetching container image {image_name} in service {svc_name}")
+            futures[svc_name] = executor.submit(
+                pull_image, client, image_name, platform=platform)
+    # Only report the references once all pulls are done.
+    return {svc_name: future.result() for svc_name, future in futures.items()}
+
+
 def login_to_registries(client, logins):
     """Log in to multiple registries
 
@@ -614,12 +798,14 @@ def download_containers_by_compose_file(
             show_progress = False
 
     with open(compose_path, encoding='utf-8') as file:
-        compose_file_data = yaml.safe_load(file)
+        compose_file_text = file.read()
+    compose_file_data = yaml.safe_load(compose_file_text)
 
     # Basic compose file validation e.g. if it has 'services' section, images are specified, etc.
     validate_compose_file(compose_file_data)
 
-    if not keep_double_dollar_sign:
+    # No need to walk the whole document when the file has no '$$' at all.
+    if not keep_double_dollar_sign and "$$" in compose_file_text:
         compose_file_data = recursive_yaml_value_check(compose_file_data, "")
 
     if use_host_docker:
@@ -646,23 +832,17 @@ def download_containers_by_compose_file(
             login_to_registries(dind_client, logins)
 
         # Now we can fetch the containers...
-        for svc_name, svc_spec in compose_file_data['services'].items():
+        services = compose_file_data['services']
+        images = {}
+        for svc_name, svc_spec in services.items():
             image_name = svc_spec.get('image')
-            log.info(f"Fetching container image {image_name} in service {svc_name}")
             if not ":" in image_name:
                 image_name += ":latest"
+            images[svc_name] = image_name
 
-            if show_progress:
-                # Use low-level API to get progress information.
-                res_stream = dind_client.api.pull(
-                    image_name, stream=True, decode=True, platform=platform)
-                show_pull_progress_xterm(res_stream)
-                image = dind_client.images.get(image_name)
-            else:
-                # Use high-level API (no progress info).
-                image = dind_client.images.pull(image_name, platform=platform)
-
-            svc_spec['image'] = image.attrs['RepoDigests'][0]
+        for svc_name, image_ref in pull_images(
+                dind_client, images, platform, show_progress).items():
+            services[svc_name]['image'] = image_ref
 
         log.info("Saving Docker Compose file")
         with open(os.path.join(manager.output_dir, "docker-compose.yml"), "w") as file:
@@ -3,6 +3,9 @@ import shutil
 import logging
 import re
 import datetime
+import signal
+import subprocess
+import tempfile
 
 import fnmatch
 import guestfs
@@ -52,6 +55,45 @@ def check_docker_storage_file(bundle_dir):
     return None
 
 
+def tar_in_zstd(gfs, tarball, dest):
+    """Unpack a zstd-compressed tarball into directory 'dest' of the guest.
+
+    guestfs' tar_in() does not support zstd, so the tarball is decompressed on
+    the host into a named pipe which tar_in() reads as an uncompressed tarball;
+    this way the uncompressed data is never written to disk.
+    """
+    with tempfile.TemporaryDirectory() as fifo_dir:
+        fifo_path = os.path.join(fifo_dir, "bundle.tar")
+        os.mkfifo(fifo_path)
+        # Opening the pipe for writing blocks until tar_in() opens it for reading.
+        zstd_proc = subprocess.Popen(  # pylint: disable=consider-using-with
+            ["sh", "-c", 'exec zstd -d -c -- "$1" > "$2"', "sh", tarball, fifo_path])
+        unpacked = False
+        try:
+            gfs.tar_in(fifo_path, dest)
+            unpacked = True
+        finally:
+            if not unpacked:
+                # Do not leave zstd blocked on a pipe nobody reads anymore.
+                zstd_proc.kill()
+                zstd_proc.wait()
+        # A reader stopping right after the end-of-archive marker may leave
+        # zstd with a broken pipe; that is not an error.
+        zstd_status = zstd_proc.wait()
+    if zstd_status not in (0, -signal.SIGPIPE):
+        raise TorizonCoreBuilderError(
+            f"Could not decompress {os.path.basename(tarball)} (zstd status: {zstd_status}).")
+
+
+def tar_in(gfs, tarball, dest):
+    """Unpack a (possibly compressed) tarball into directory 'dest' of the guest."""
+    if tarball.endswith(".zst"):
+        tar_in_zstd(gfs, tarball, dest)
+    else:
+        gfs.tar_in(tarball, dest,
+                   compress=TAR_EXT_TO_COMPRESSION_TYPE[os.path.splitext(tarball)[1]])
+
+
 def set_autoreboot(output_dir, include):
     wrapup_sh = os.path.join(os.path.abspath(output_dir), 'wrapup.sh')
 
@@ -325,9 +367,8 @@ def combine_raw_image(image_path, bundle_dir, output_path, rootfs_label, force):
 
                 if untar:
                     run_with_loading_animation(
-                        func=gfs.tar_in,
-                        args=(os.path.join(bundle_dir, src), dest),
-                        kwargs={'compress': TAR_EXT_TO_COMPRESSION_TYPE[os.path.splitext(src)[1]]},
+                        func=tar_in,
+                        args=(gfs, os.path.join(bundle_dir, src), dest),
                         loading_msg=f"  Unpacking {src} to {dest} ...")
 
                 else:
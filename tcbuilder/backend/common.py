@@ -9,6 +9,7 @@ import sys
 import time
 import threading
 import binascii
+import functools
 
 from typing import Optional
 
@@ -32,6 +33,10 @@ from tcbuilder.errors import (FileContentMissing, OperationFailureError,
 log = logging.getLogger("torizon." + __name__)
 
 DOCKER_BUNDLE_TARNAME = "docker-storage.tar"
+DOCKER_BUNDLE_FILENAME = f"{DOCKER_BUNDLE_TARNAME}.zst"
+
+# Name of the OSTree archive repository inside the storage directory.
+OSTREE_ARCHIVE_DIRNAME = "ostree-archive"
 
 # Mapping from architecture to a Docker platform.
 ARCH_TO_DOCKER_PLAT = {
@@ -474,8 +479,11 @@ def checkout_dt_git_repo(storage_dir, git_repo=None, git_branch=None):
     if git_repo is None:
         repo_obj = git.Repo.clone_from("https://github.com/toradex/device-trees",
                                        "device-trees")
-    elif git_repo.startswith("https://") or git_repo.startswith("git://"):
-        directory_name = git_repo.rsplit('/', 1)[1].rsplit('.', 1)[0]
+    elif git_repo.startswith(("https://", "git://", "ssh://")):
+        # Name the clone like 'git clone' does: last URL component minus any ".git".
+        directory_name = git_repo.rpartition('/')[2]
+        if directory_name.endswith(".git"):
+            directory_name = directory_name[:-len(".git")]
         repo_obj = git.Repo.clone_from(git_repo, directory_name)
     else:
         repo_obj = git.Repo(git_repo)
@@ -559,10 +567,16 @@ def get_own_container_id(
     raise OperationFailureError("Can't determine current container ID.")
 
 
+@functools.lru_cache(maxsize=1)
+def get_host_docker_client():
+    """Get the client object for the Docker host (shared by all callers)"""
+    return DockerClient.from_env()
+
+
 def get_host_workdir():
     """Get location of working directory w.r.t. the host"""
 
-    docker_client = DockerClient.from_env()
+    docker_client = get_host_docker_client()
     container_id = get_own_container_id(docker_client)
 
     try:
@@ -582,10 +596,15 @@ def get_host_workdir():
     return None, None
 
 
+def get_ostree_archive_dir(storage_dir):
+    """Returns the OSTree archive repository unpacked in the storage directory"""
+    return os.path.join(storage_dir, OSTREE_ARCHIVE_DIRNAME)
+
+
 def get_arch_from_ostree(storage_dir, ref="base"):
     """Determine architecture from OSTree metadata"""
 
-    src_ostree_archive_dir = os.path.join(storage_dir, "ostree-archive")
+    src_ostree_archive_dir = get_ostree_archive_dir(storage_dir)
     if not os.path.isdir(src_ostree_archive_dir):
         raise InvalidStateError(
             f"Source OSTree archive ({src_ostree_archive_dir}) does not exist!")
@@ -703,6 +722,25 @@ def set_output_ownership(output_file, set_parents=False):
                                     workdir_uid, workdir_gid)
 
 
+def _storage_dir_entries(storage_dir):
+    """
+    Return the set of entry names directly under "storage_dir", reading the
+    directory once instead of stat'ing each expected entry separately.
+
+    :param storage_dir: Storage directory.
+    :raises:
+        PathNotExistError: if "storage_dir" does not exist.
+    """
+    try:
+        with os.scandir(storage_dir) as entries:
+            return {entry.name for entry in entries}
+    except FileNotFoundError as exc:
+        raise PathNotExistError(
+            f"Storage directory \"{storage_dir}\" does not exist.") from exc
+    except NotADirectoryError:
+        return set()
+
+
 def images_unpack_executed(storage_dir):
     """
     Check both, if "storage_dir" exists and if a "torizoncore-builder images
@@ -713,15 +751,8 @@ def images_unpack_executed(storage_dir):
         PathNotExistError: if "storage_dir" does not exist.
         ImageUnpackError: if "images unpack" was not executed previously.
     """
-    if not os.path.exists(storage_dir):
-        raise PathNotExistError(
-            f"Storage directory \"{storage_dir}\" does not exist.")
-
-    image_dirs = ("ostree-archive", "sysroot")
-
-    for image_dir in image_dirs:
-        if not os.path.exists(os.path.join(storage_dir, image_dir)):
-            raise ImageUnpackError()
+    if not _storage_dir_entries(storage_dir).issuperset((OSTREE_ARCHIVE_DIRNAME, "sysroot")):
+        raise ImageUnpackError()
 
 
 def unpacked_image_type(storage_dir):
@@ -735,11 +766,7 @@ def unpacked_image_type(storage_dir):
         PathNotExistError: if "storage_dir" does not exist.
     :return: "tezi" or "wic", depending on the image
     """
-    if not os.path.exists(storage_dir):
-        raise PathNotExistError(
-            f"Storage directory \"{storage_dir}\" does not exist.")
-
-    if os.path.exists(os.path.join(storage_dir, "tezi")):
+    if "tezi" in _storage_dir_entries(storage_dir):
         return "tezi"
 
     return "raw"
@@ -750,7 +777,7 @@ def get_own_network():
     Given the host `docker_client`. This function returns
     the network mode of this instance of the tcb container.
     """
-    host_client = DockerClient.from_env()
+    host_client = get_host_docker_client()
     tcb_id = get_own_container_id(host_client)
     try:
         tcb = host_client.containers.get(tcb_id)
@@ -764,6 +791,23 @@ def get_own_network():
     return network
 
 
+def get_own_image():
+    """Determine the image of the current tcb container
+
+    This function returns the ID of the image this instance of the tcb
+    container was created from.
+    """
+    host_client = get_host_docker_client()
+    tcb_id = get_own_container_id(host_client)
+    try:
+        tcb = host_client.containers.get(tcb_id)
+    except NotFound as exc:
+        raise OperationFailureError(
+            "Can't retrieve container information from docker.") from exc
+
+    return tcb.attrs["Image"]
+
+
 def check_licence_acceptance(image_dir, tezi_props):
     if tezi_props.get("accept_licence"):
         return
@@ -2,6 +2,7 @@
 Backend for the DT (device-tree) related operations.
 """
 
+import functools
 import logging
 import json
 import os
@@ -80,18 +81,48 @@ def get_current_dtb_basename(storage_dir):
     return None
 
 
-def get_dtb_kernel_subdir(storage_dir):
-    '''Returns "usr/lib/modules/<kernel_version/dtb".'''
+@functools.lru_cache(maxsize=4)
+def _find_dtb_kernel_dir(deploy_dir, _deploy_dir_stamp):
+    '''Search 'deploy_dir' for the kernel device tree directory.
 
+    The stamp argument is only part of the cache key, so that a re-unpacked
+    deployment is searched again.
+    '''
     answer = subprocess.check_output(
-        ("set -o pipefail && "
-         f"find {storage_dir}/sysroot/ostree/deploy -type d -name dtb -print -quit |"
-         " sed -r -e 's|.*/(usr/lib/modules/)|\\1|'"),
-        shell=True, text=True).strip()
+        ["find", deploy_dir, "-type", "d", "-name", "dtb", "-print", "-quit"],
+        text=True).strip()
     assert answer, "panic: missing kernel device tree directory!"
     return answer
 
 
+def get_dtb_kernel_dir(storage_dir):
+    '''Returns the full path to "usr/lib/modules/<kernel_version>/dtb" in the deployment.'''
+
+    deploy_dir = f"{storage_dir}/sysroot/ostree/deploy"
+    try:
+        stat = os.stat(deploy_dir)
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+    except FileNotFoundError:
+        stamp = None
+    return _find_dtb_kernel_dir(deploy_dir, stamp)
+
+
+def get_dtb_kernel_subdir(storage_dir):
+    '''Returns "usr/lib/modules/<kernel_version/dtb".'''
+
+    answer = get_dtb_kernel_dir(storage_dir)
+    # Strip everything up to the last "/usr/lib/modules/" (the deployment root).
+    index = answer.rfind("/usr/lib/modules/")
+    return answer[index + 1:] if index >= 0 else answer
+
+
+def list_dtb_basenames(dtb_dir):
+    '''Returns the sorted base names of the device tree blobs in directory 'dtb_dir'.'''
+    with os.scandir(dtb_dir) as entries:
+        return sorted(entry.name for entry in entries
+                      if entry.name.endswith(".dtb") and entry.is_file(follow_symlinks=False))
+
+
 def get_current_dtb_path(storage_dir):
     '''Query the path to the currently applied device tree blob.
 
@@ -111,7 +142,11 @@ def get_current_dtb_path(storage_dir):
         if os.path.exists(answer):
             # This is a recently applied device tree.
             return (answer, True)
-        # This is a device tree from the base image.
+        # This is a device tree from the base image; look it up directly in the kernel
+        # device tree directory before resorting to walking the whole deployment.
+        answer = os.path.join(get_dtb_kernel_dir(storage_dir), dtb_basename)
+        if os.path.exists(answer):
+            return (answer, True)
         answer = subprocess.check_output(
             ["find", f"{storage_dir}/sysroot/ostree/deploy", "-type", "f",
              "-name", dtb_basename, "-print", "-quit"],
@@ -120,7 +155,13 @@ def get_current_dtb_path(storage_dir):
         return (answer, True)
 
     # Cannot identify the device tree by peeking the boot loader configuration.
-    # Hint by returning the first device tree blob found in the base image.
+    # Hint by returning the first device tree blob found in the base image. Pick it from
+    # the kernel device tree directory, which callers list again when reporting the
+    # choices, rather than walking the whole deployment for it.
+    dtb_dir = get_dtb_kernel_dir(storage_dir)
+    dtb_basenames = list_dtb_basenames(dtb_dir)
+    if dtb_basenames:
+        return (os.path.join(dtb_dir, dtb_basenames[0]), False)
     answer = subprocess.check_output(
         ["find", f"{storage_dir}/sysroot/ostree/deploy", "-type", "f",
          "-name", "*.dtb", "-print", "-quit"],
@@ -129,6 +170,22 @@ def get_current_dtb_path(storage_dir):
     return (answer, False)
 
 
+def resolve_dtb_path(storage_dir, dtb_name):
+    '''Resolve the device tree blob 'dtb_name' given by the user to a path.
+
+    An existing file is used as is. Otherwise 'dtb_name' is taken as the base name
+    of a device tree blob, looked up first among the recently applied device trees
+    and then in the base image.
+    '''
+    if os.path.isfile(dtb_name):
+        return os.path.abspath(dtb_name)
+    path = os.path.join(get_dt_changes_dir(storage_dir),
+                        get_dtb_kernel_subdir(storage_dir), dtb_name)
+    if os.path.exists(path):
+        return path
+    return os.path.join(get_dtb_kernel_dir(storage_dir), dtb_name)
+
+
 def build_dts(source_dts_path, include_dirs, target_dtb_path):
     '''Compile the device tree source file 'source_dts_path' to 'target_dtb_path'.
        Returns True on successful compilation, False otherwise.
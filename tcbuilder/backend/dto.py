@@ -42,21 +42,32 @@ def get_applied_overlays_base_names(storage_dir):
         "fdt_overlays", overlays_txt_path).split()
 
 
-def find_path_to_overlay(storage_dir, basename):
+def get_overlays_changes_dir(storage_dir):
+    """Returns the directory that contains recently applied overlay blobs."""
+    return os.path.join(dt.get_dt_changes_dir(storage_dir),
+                        dt.get_dtb_kernel_subdir(storage_dir), "overlays")
+
+
+def find_path_to_overlay(storage_dir, basename, overlays_dir=None):
     """Get the full path of the overlay blob file.
 
     Given the base name of an overlay blob file, return the full path to it
-    (or die trying).
+    (or die trying). Callers looking up several overlays can pass the result
+    of get_overlays_changes_dir() as `overlays_dir` to avoid recomputing it.
     """
 
-    path = os.path.join(dt.get_dt_changes_dir(storage_dir),
-                        dt.get_dtb_kernel_subdir(storage_dir),
-                        "overlays", basename)
+    if overlays_dir is None:
+        overlays_dir = get_overlays_changes_dir(storage_dir)
+    path = os.path.join(overlays_dir, basename)
     if os.path.exists(path):
         # There is a recently applied (but not yet deployed) overlay blob with
         # this base name.
         return path
-    # Resort to the overlay blobs of the base image.
+    # Resort to the overlay blobs of the base image, which normally live next to
+    # its device tree blobs; only walk the whole deployment if they do not.
+    path = os.path.join(dt.get_dtb_kernel_dir(storage_dir), "overlays", basename)
+    if os.path.exists(path):
+        return path
     path = subprocess.check_output(
         ["find",
          os.path.join(storage_dir, "sysroot/ostree/deploy"),
@@ -71,7 +82,11 @@ def get_applied_overlay_paths(storage_dir, base_names=None):
     """Query the paths to the currently applied overlays."""
     if base_names is None:
         base_names = get_applied_overlays_base_names(storage_dir)
-    return [find_path_to_overlay(storage_dir, basename) for basename in base_names]
+    if not base_names:
+        return []
+    overlays_dir = get_overlays_changes_dir(storage_dir)
+    return [find_path_to_overlay(storage_dir, basename, overlays_dir)
+            for basename in base_names]
 
 
 def modify_dtb_by_overlays(source_dtb_path, source_dtob_paths, target_dtb_path):
@@ -1,7 +1,9 @@
 import datetime
 import os
+import shutil
 import subprocess
 import shlex
+import tempfile
 
 import paramiko
 
@@ -9,7 +11,7 @@ from tcbuilder.errors import OperationFailureError, TorizonCoreBuilderError
 from tcbuilder.backend.ostree import OSTREE_WHITEOUT_PREFIX, OSTREE_OPAQUE_WHITEOUT_NAME
 from tcbuilder.backend.common import resolve_remote_host
 
-IGNORE_FILES = [
+IGNORE_FILES = frozenset([
     'group-',
     'shadow-',
     'gshadow-',
@@ -28,8 +30,11 @@ IGNORE_FILES = [
     'ssh/ssh_host_ed25519_key.pub',
     'systemd/system/sysinit.target.wants/run-postinsts.service',
     'ostree/remotes.d/toradex-nightly.conf',
-]
-TAR_NAME = 'isolated_changes.tar'
+])
+
+# SSH window and copy chunk sizes used when streaming data from the target
+STREAM_WINDOW_SIZE = 16 * 1024 * 1024
+STREAM_CHUNK_SIZE = 1024 * 1024
 
 NO_CHANGES = 0
 CHANGES_CAPTURED = 1
@@ -44,6 +49,67 @@ def run_command_with_sudo(client, command, password):
     return status, stdin, stdout
 
 
+def stream_command_with_sudo(client, command, password, output_fd):
+    # No PTY here: the (binary) output of the command must not be mangled.
+    # The channel is opened with a bigger window than paramiko's default so
+    # that bulk data is not throttled by window adjustments.
+    channel = client.get_transport().open_session(window_size=STREAM_WINDOW_SIZE)
+    channel.exec_command(command)
+    stdin = channel.makefile_stdin('wb')
+    stdout = channel.makefile('rb')
+    stderr = channel.makefile_stderr('rb')
+    stdin.write(password + '\n')
+    stdin.flush()
+    try:
+        shutil.copyfileobj(stdout, output_fd, STREAM_CHUNK_SIZE)
+    except BrokenPipeError:
+        # The local consumer exited early: stop the remote command unless it
+        # is already done; the exit status is then -1 if it was not received.
+        if not channel.exit_status_ready():
+            channel.close()
+    status = channel.recv_exit_status()  # wait for exec_command to finish
+
+    return status, stderr
+
+
+def extract_remote_tar(client, tar_command, password, dest_dir):
+    """
+    Run tar_command (with sudo) on the target and extract the tar stream it
+    writes into its standard output locally in dest_dir as it arrives.
+
+    :returns: A tuple (status, stderr, extract_status, extract_output) with
+              the exit status and stderr of the remote command plus the exit
+              status and output of the local extraction.
+    """
+    extract_tar_cmd = [
+        "tar", "--acls", "--xattrs", "--overwrite", "--preserve-permissions",
+        "-xf", "-", "-C", dest_dir
+    ]
+    with tempfile.TemporaryFile() as extract_log:
+        extract_proc = subprocess.Popen(  # pylint: disable=consider-using-with
+            extract_tar_cmd, stdin=subprocess.PIPE,
+            stdout=extract_log, stderr=subprocess.STDOUT)
+        streamed = False
+        try:
+            status, stderr = stream_command_with_sudo(client, tar_command, password,
+                                                      extract_proc.stdin)
+            streamed = True
+        finally:
+            try:
+                extract_proc.stdin.close()
+            except BrokenPipeError:
+                # local tar exited early: its own error is reported below
+                pass
+            if not streamed:
+                # The transfer failed: do not leave the local tar behind.
+                extract_proc.kill()
+            extract_status = extract_proc.wait()
+        extract_log.seek(0)
+        extract_output = extract_log.read().decode('utf-8').strip()
+
+    return status, stderr, extract_status, extract_output
+
+
 def run_command_without_sudo(client, command):
     stdin, stdout, _stderr = client.exec_command(command)
     status = stdout.channel.recv_exit_status()  # wait for exec_command to finish
@@ -51,13 +117,19 @@ def run_command_without_sudo(client, command):
     return status, stdin, stdout
 
 
-def ignore_changes_deletion(change):
-    # NOTE: this offset must match the output of `ostree admin config`:
-    fname = change[5:]
-    if not fname or fname in IGNORE_FILES:
-        return False  # ignore file
+def parse_changes(output):
+    """
+    Parse the lines output by `ostree admin config-diff` into a list of
+    (change type, file name) tuples, leaving out the files to be ignored.
+    """
+    changes = []
+    for line in output:
+        # NOTE: this offset must match the output of `ostree admin config-diff`:
+        fname = line[5:]
+        if fname and fname not in IGNORE_FILES:
+            changes.append((line[0], fname))
 
-    return True
+    return changes
 
 
 def remove_tmp_dir(client, tmp_dir_name):
@@ -65,29 +137,36 @@ def remove_tmp_dir(client, tmp_dir_name):
 
 
 def check_path(path):
-    return '/' if path.rsplit('/', 1)[0] == path else '/{}/'.format(
-        path.rsplit('/', 1)[0])
+    parent, sep, _name = path.rpartition('/')
+    return '/{}/'.format(parent) if sep else '/'
 
 
-def whiteouts(client, sftp_channel, tmp_dir_name, deleted_f_d):
+def whiteout_path(sftp_channel, deleted_f_d, listdir_cache):
+    """
+    Get the path (relative to the temporary directory) of the whiteout
+    file representing a deleted file/dir; directory listings from the
+    target are cached in listdir_cache (keyed by directory).
+    """
     # check if deleted file/dir was in subdirectory of /etc --> '/' for file/dir at /etc
     path = check_path(deleted_f_d)
     if path != '/':  # file/dir was in subdirectory of /etc
         # check if any file exists other than file/dir deleted in same subdirectory of /etc
-        d_list = sftp_channel.listdir('/etc' + path)
-        if not d_list:  # entire content(s) deleted
-            deleted_file_dir_to_tar = 'etc' + path + OSTREE_OPAQUE_WHITEOUT_NAME
-        else:
-            deleted_file_dir_to_tar = 'etc' + path + OSTREE_WHITEOUT_PREFIX \
-                                        + deleted_f_d.rsplit('/', 1)[1]
-    else:
-        deleted_file_dir_to_tar = 'etc' + path + OSTREE_WHITEOUT_PREFIX \
-                                    + deleted_f_d
-
-    # create deleted files/dir in torizonbuilder tmp directory with whiteout format
-    create_deleted_info_cmd = 'mkdir -p {0}/{1} && touch {0}/{2}'.format(
-        tmp_dir_name, deleted_file_dir_to_tar.rsplit('/', 1)[0],
-        shlex.quote(deleted_file_dir_to_tar))
+        if path not in listdir_cache:
+            listdir_cache[path] = sftp_channel.listdir('/etc' + path)
+        if not listdir_cache[path]:  # entire content(s) deleted
+            return 'etc' + path + OSTREE_OPAQUE_WHITEOUT_NAME
+        return 'etc' + path + OSTREE_WHITEOUT_PREFIX + deleted_f_d.rpartition('/')[2]
+
+    return 'etc' + path + OSTREE_WHITEOUT_PREFIX + deleted_f_d
+
+
+def whiteouts(client, tmp_dir_name, whiteout_paths):
+    # create deleted files/dir in torizonbuilder tmp directory with whiteout format;
+    # all of them are created by a single remote command to save round-trips
+    dirs = sorted({wh_path.rpartition('/')[0] for wh_path in whiteout_paths})
+    create_deleted_info_cmd = 'mkdir {0} && cd {0} && mkdir -p {1} && touch {2}'.format(
+        shlex.quote(tmp_dir_name), list_to_string_with_quote(dirs),
+        list_to_string_with_quote(whiteout_paths))
     status, _stdin, stdout = run_command_without_sudo(client, create_deleted_info_cmd)
     if status > 0:
         raise OperationFailureError(
@@ -164,8 +243,7 @@ def isolate_user_changes(diff_dir, r_name_ip, r_username, r_password, r_port, r_
     output = output[(indx + 1):]
 
     # filter out files
-    changed_itr = filter(ignore_changes_deletion, output)
-    changes = list(changed_itr)
+    changes = parse_changes(output)
     if not changes:
         return NO_CHANGES
 
@@ -174,44 +252,58 @@ def isolate_user_changes(diff_dir, r_name_ip, r_username, r_password, r_port, r_
 
     sftp = client.open_sftp()
     if sftp is not None:
-        # perform all operations in /tmp
+        # perform all operations in /tmp (only created when there are whiteouts)
         tmp_dir_name = '/tmp/torizon-builder-' + str(datetime.datetime.now().date()) + '_' + str(
             datetime.datetime.now().time()).replace(':', '-')
-        sftp.mkdir(tmp_dir_name)
 
         files_dir_to_tar = ''
         files_list = []
-        f_delete_exists = False
+        whiteout_paths = []
+        listdir_cache = {}
         # append /etc because ostree config provides file/dir names relative to /etc
-        for item in changes:
-            f_name = item[5:]   # Sync with ignore_changes_deletion
-            if item[0] != 'D':
+        for change_type, f_name in changes:
+            if change_type != 'D':
                 files_list.append('/etc/' + f_name)
             else:
-                f_delete_exists = True
-                whiteouts(client, sftp, tmp_dir_name, f_name)
+                whiteout_paths.append(whiteout_path(sftp, f_name, listdir_cache))
+
+        f_delete_exists = bool(whiteout_paths)
+        if f_delete_exists:
+            whiteouts(client, tmp_dir_name, whiteout_paths)
 
         files_dir_to_tar = list_to_string_with_quote(files_list)
         if f_delete_exists:
-            tar_command = "sudo tar --exclude={0} --xattrs --acls -cf {1}/{0} -C {1} . {2}". \
-                format(TAR_NAME, tmp_dir_name, files_dir_to_tar)
+            tar_command = "sudo -S -p '' tar --xattrs --acls -cf - -C {0} . {1}". \
+                format(tmp_dir_name, files_dir_to_tar)
         else:
             # don't include current directory i.e. '.':
             # whiteout files does not exist in /tmp/torizon-builder/
-            tar_command = "sudo tar --xattrs --acls -cf {1}/{0} {2}".format(
-                TAR_NAME, tmp_dir_name, files_dir_to_tar)
-        # make tar
-        status, _stdin, stdout = run_command_with_sudo(client, tar_command, r_password)
-        if status > 0:
+            tar_command = "sudo -S -p '' tar --xattrs --acls -cf - {0}".format(
+                files_dir_to_tar)
+        # Extract tar to diff_dir/usr/ so that at time of union
+        # they can be committed to /usr/etc of unpacked image as it is;
+        # the stream from the target is extracted as it arrives
+        os.mkdir(os.path.join(diff_dir, "usr"))
+        status, stderr, extract_status, extract_output = extract_remote_tar(
+            client, tar_command, r_password, os.path.join(diff_dir, "usr", ""))
+        if f_delete_exists:
             remove_tmp_dir(client, tmp_dir_name)
+        # A local extraction failure also breaks the remote end of the stream,
+        # so it is checked first as the root cause. Negative statuses are
+        # failures too: tar killed by a signal, or no exit status received
+        # (-1) from the target. GNU tar accepts a stream cut at a member
+        # boundary, so an incomplete transfer must not pass as success.
+        if extract_status != 0:
+            sftp.close()
+            client.close()
+            raise OperationFailureError('Unable to extract changes from target',
+                                        extract_output)
+        if status != 0:
             sftp.close()
             client.close()
             raise OperationFailureError('Unable to bundle up changes at target',
-                                        stdout.read().decode('utf-8').strip())
+                                        stderr.read().decode('utf-8').strip())
 
-        # get the tar
-        sftp.get(tmp_dir_name + '/' + TAR_NAME, diff_dir + '/' + TAR_NAME, None)
-        remove_tmp_dir(client, tmp_dir_name)
         sftp.close()
 
         tcattr = get_tcattr_file_content(files_dir_to_tar, client, sftp,
@@ -222,18 +314,7 @@ def isolate_user_changes(diff_dir, r_name_ip, r_username, r_password, r_port, r_
 
     client.close()
 
-    # Extract tar to diff_dir/usr/ so that at time of union
-    # they can be committed to /usr/etc of unpacked image as it is
-    os.mkdir(os.path.join(diff_dir, "usr"))
-    extract_tar_cmd = [
-        "tar", "--acls", "--xattrs", "--overwrite", "--preserve-permissions", "-xf",
-        os.path.join(diff_dir, TAR_NAME), "-C", os.path.join(diff_dir, "usr", "")
-    ]
-    subprocess.check_output(extract_tar_cmd, stderr=subprocess.STDOUT)
-
     create_tcattr_file(diff_dir, tcattr)
 
-    os.remove(os.path.join(diff_dir, TAR_NAME))
-
     return CHANGES_CAPTURED
 # pylint: enable=too-many-locals
@@ -378,13 +378,9 @@ def copy_file(repo, commit, input_file, output_file):
 class TCBuilderHTTPRequestHandler(SimpleHTTPRequestHandler):
     """SimpleHTTPRequestHandler which makes use of logging framework"""
 
-    def __init__(self, *args, **kwargs):
-        self.log = logging.getLogger("torizon." + __name__)
-        super().__init__(*args, **kwargs)
-
-    #pylint: disable=redefined-builtin,logging-not-lazy
+    #pylint: disable=redefined-builtin
     def log_message(self, format, *args):
-        self.log.debug(format % args)
+        log.debug(format, *args)
 
 
 class HTTPThread(threading.Thread):
@@ -393,8 +389,7 @@ class HTTPThread(threading.Thread):
     def __init__(self, directory, host="", port=DEFAULT_SERVER_PORT):
         threading.Thread.__init__(self, daemon=True)
 
-        self.log = logging.getLogger("torizon." + __name__)
-        self.log.info("Starting http server to serve OSTree.")
+        log.info("Starting http server to serve OSTree.")
 
         # From what I understand, this creates a __init__ function with the
         # directory argument already set. Nice hack!
@@ -406,7 +401,7 @@ class HTTPThread(threading.Thread):
 
     def shutdown(self):
         """Shutdown HTTP server"""
-        self.log.debug("Shutting down http server.")
+        log.debug("Shutting down http server.")
         self.http_server.shutdown()
 
     @property
@@ -449,7 +449,7 @@ def handle_bundle_common(storage_dir, bundle_props, compress_tar=True):
                 "compose_file": bundle_props["compose-file"],
                 "host_workdir": common.get_host_workdir()[0],
                 "use_host_docker": False,
-                "output_filename": f"{common.DOCKER_BUNDLE_TARNAME}.xz" if compress_tar
+                "output_filename": common.DOCKER_BUNDLE_FILENAME if compress_tar
                                    else common.DOCKER_BUNDLE_TARNAME,
                 "keep_double_dollar_sign": bundle_props.get("keep-double-dollar-sign", False),
                 "platform": platform,
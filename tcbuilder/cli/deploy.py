@@ -49,7 +49,7 @@ def deploy_tezi_image(ostree_ref, output_dir, storage_dir, deploy_sysroot_dir,
     common.check_licence_acceptance(tezi_dir, tezi_props)
 
     src_sysroot_dir = os.path.join(storage_dir_, "sysroot")
-    src_ostree_archive_dir = os.path.join(storage_dir_, "ostree-archive")
+    src_ostree_archive_dir = common.get_ostree_archive_dir(storage_dir_)
 
     dst_sysroot_dir_ = os.path.abspath(deploy_sysroot_dir)
 
@@ -91,7 +91,7 @@ def deploy_raw_image(ostree_ref, base_raw_img, output_raw_img, storage_dir,
     storage_dir_ = os.path.abspath(storage_dir)
 
     src_sysroot_dir = os.path.join(storage_dir_, "sysroot")
-    src_ostree_archive_dir = os.path.join(storage_dir_, "ostree-archive")
+    src_ostree_archive_dir = common.get_ostree_archive_dir(storage_dir_)
 
     dst_sysroot_dir_ = os.path.abspath(deploy_sysroot_dir)
 
@@ -179,7 +179,7 @@ def deploy_ostree_remote(storage_dir, remote_host, remote_username,
     storage_dir_ = os.path.abspath(storage_dir)
     common.images_unpack_executed(storage_dir_)
 
-    src_ostree_archive_dir = os.path.join(storage_dir_, "ostree-archive")
+    src_ostree_archive_dir = common.get_ostree_archive_dir(storage_dir_)
 
     dbe.deploy_ostree_remote(remote_host, remote_username, remote_password,
                              remote_port, mdns_source, src_ostree_archive_dir,
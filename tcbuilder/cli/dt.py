@@ -14,6 +14,7 @@ import re
 
 from tcbuilder.backend import dt
 from tcbuilder.backend.common import (checkout_dt_git_repo,
+                                      get_ostree_archive_dir,
                                       set_output_ownership,
                                       images_unpack_executed,
                                       update_dt_git_repo,
@@ -26,13 +27,14 @@ log = logging.getLogger("torizon." + __name__)
 
 def do_dt_status(args):
     '''Perform the 'dt status' command.'''
+    storage_dir = os.path.abspath(args.storage_directory)
 
-    images_unpack_executed(args.storage_directory)
-    if unpacked_image_type(args.storage_directory) == "raw":
+    images_unpack_executed(storage_dir)
+    if unpacked_image_type(storage_dir) == "raw":
         raise InvalidDataError("dt commands are not supported for WIC/raw images. "
                                "Aborting.")
 
-    dtb_basename = dt.get_current_dtb_basename(args.storage_directory)
+    dtb_basename = dt.get_current_dtb_basename(storage_dir)
     if not dtb_basename:
         log.error("error: cannot identify the enabled device tree in the image "
                   "because it is dynamically selected at runtime.")
@@ -45,11 +47,13 @@ def do_dt_checkout(args):
     '''Perform the 'dt checkout' command.'''
     storage_dir = os.path.abspath(args.storage_directory)
 
+    dt_repo_dir = os.path.abspath("device-trees")
+
     images_unpack_executed(storage_dir)
 
     # Retrieve the Toradex device-tree repository, if not already retrieved.
     try:
-        if os.path.exists(os.path.abspath("device-trees")):
+        if os.path.exists(dt_repo_dir):
             if not args.update:
                 raise InvalidStateError("'device-trees' directory already exists")
             update_dt_git_repo()
@@ -62,8 +66,8 @@ def do_dt_checkout(args):
         log.debug(traceback.format_exc())  # full traceback to be shown for debugging only
         sys.exit(1)
     finally:
-        if os.path.exists(os.path.abspath("device-trees")):
-            set_output_ownership("device-trees")
+        if os.path.exists(dt_repo_dir):
+            set_output_ownership(dt_repo_dir)
 
 
 def dt_apply(dts_path, storage_dir, include_dirs=None):
@@ -114,7 +118,7 @@ def dt_apply(dts_path, storage_dir, include_dirs=None):
         file.write(f"fdtfile={dtb_target_basename}\n")
     subprocess.check_call(
         "set -o pipefail && "
-        f"ostree --repo={shlex.quote(storage_dir)}/ostree-archive "
+        f"ostree --repo={shlex.quote(get_ostree_archive_dir(storage_dir))} "
         f"cat base /usr/lib/ostree-boot/uEnv.txt | sed /^fdtfile=/d "
         f">>{shlex.quote(uenv_target_path)}",
         shell=True)
@@ -130,7 +134,8 @@ def dt_apply(dts_path, storage_dir, include_dirs=None):
 
 def do_dt_apply(args):
     '''Perform the 'dt apply' command.'''
-    dt_apply(args.dts_path, args.storage_directory, include_dirs=args.include_dirs)
+    dt_apply(args.dts_path, os.path.abspath(args.storage_directory),
+             include_dirs=args.include_dirs)
 
 
 def init_parser(subparsers):
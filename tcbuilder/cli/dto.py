@@ -20,6 +20,9 @@ from tcbuilder.errors import InvalidDataError
 
 log = logging.getLogger("torizon." + __name__)
 
+# File extensions accepted by --device-tree in 'dto list'.
+DEVICE_TREE_EXTENSIONS = frozenset((".dtb", ".dts"))
+
 # Dear maintainer, the following code employs these abbreviations as pieces of variable names:
 # - dts: device tree source
 # - dtb: device tree blob
@@ -77,9 +80,8 @@ def dto_apply(dtos_path, dtb_path, include_dirs, storage_dir,
     # Test apply the overlay against the current device tree and other applied overlays.
     if test_apply:
         if dtb_path:
-            # User has provided the basename of a device tree blob of the base image.
-            (any_dtb_path, _) = dt.get_current_dtb_path(storage_dir)
-            dtb_path = os.path.join(os.path.dirname(any_dtb_path), dtb_path)
+            # User has provided a device tree blob file or the basename of one in the image.
+            dtb_path = dt.resolve_dtb_path(storage_dir, dtb_path)
         else:
             # Use the current device tree blob.
             (dtb_path, is_dtb_exact) = dt.get_current_dtb_path(storage_dir)
@@ -87,19 +89,22 @@ def dto_apply(dtos_path, dtb_path, include_dirs, storage_dir,
                 log.error("error: could not find the device tree to check the overlay against.")
                 log.error("Please use --device-tree to pass one of the device trees below or use "
                           "--force to bypass checking:")
-                dtb_list = subprocess.check_output(
-                    ["find", os.path.dirname(dtb_path), "-maxdepth", "1", "-type", "f",
-                     "-name", "*.dtb", "-printf", "- %f\\n"],
-                    text=True).rstrip()
-                log.error(dtb_list)
+                dtb_basenames = dt.list_dtb_basenames(os.path.dirname(dtb_path))
+                log.error("\n".join(f"- {name}" for name in dtb_basenames))
                 sys.exit(1)
 
         applied_overlay_paths = \
             dto.get_applied_overlay_paths(storage_dir, base_names=applied_overlay_basenames)
         with tempfile.NamedTemporaryFile(delete=False) as tmpf:
             dtb_tmp_path = tmpf.name
-        if not dto.modify_dtb_by_overlays(dtb_path,
-                                          applied_overlay_paths + [dtob_tmp_path], dtb_tmp_path):
+        is_applicable = dto.modify_dtb_by_overlays(
+            dtb_path, applied_overlay_paths + [dtob_tmp_path], dtb_tmp_path)
+        # Only the outcome of the test matters; drop the resulting blob.
+        try:
+            os.remove(dtb_tmp_path)
+        except FileNotFoundError:
+            pass
+        if not is_applicable:
             log.error(f"error: overlay '{dtos_path}' is not applicable.")
             sys.exit(1)
         log.info(f"'{dtob_target_basename}' can successfully modify the device "
@@ -107,8 +112,7 @@ def dto_apply(dtos_path, dtb_path, include_dirs, storage_dir,
 
     # Deploy the device tree overlay blob.
     dt_changes_dir = dt.get_dt_changes_dir(storage_dir)
-    dtob_target_dir = os.path.join(
-        dt_changes_dir, dt.get_dtb_kernel_subdir(storage_dir), "overlays")
+    dtob_target_dir = dto.get_overlays_changes_dir(storage_dir)
     os.makedirs(dtob_target_dir, exist_ok=True)
     dtob_target_path = os.path.join(dtob_target_dir, dtob_target_basename)
     shutil.move(dtob_tmp_path, dtob_target_path)
@@ -140,13 +144,60 @@ def do_dto_apply(args):
     dto_apply(dtos_path=args.dtos_path,
               dtb_path=args.device_tree,
               include_dirs=args.include_dirs,
-              storage_dir=args.storage_directory,
+              storage_dir=os.path.abspath(args.storage_directory),
               allow_reapply=False,
               test_apply=not args.force)
 
 
+def write_compat_regexps(dtb_path, device_tree_ext, output_path):
+    '''Write the compatibility labels of a device tree as 'grep' patterns into a file.'''
+
+    if device_tree_ext == ".dts":
+        # The user passed a device tree source file to check compatibility against;
+        # parse the textual content of the file.
+        try:
+            # About the 'sed' invocations below:
+            # 1. The first 'sed' scans the device tree source file and extracts
+            #    the first block from "compatible =" to the semicolon.
+            # 2. The second sed filters out the "source noise" of the
+            #    compatibility values;
+            # 3. The final 'sed' prepends '^[[:blank:]]*compatible *= *'
+            #    to the compatibility values.
+            subprocess.check_output(
+                "set -o pipefail && "
+                "sed -r -e '/^[[:blank:]]*compatible *=/,/;/!d' "
+                f"-e '/;/q' {shlex.quote(dtb_path)} | tr -d '\n' | "
+                "sed -r -e 's/.*\\<compatible *= *//' "
+                "-e 's/[[:blank:]]*//g' -e 's/\";.*/\"\\n/' -e 's/\",\"/\"\\n\"/g'"
+                f">{shlex.quote(output_path)}",
+                shell=True, text=True, stderr=subprocess.STDOUT)
+        except subprocess.CalledProcessError as exc:
+            log.error(exc.output.strip())
+            log.error("error: cannot extract compatibility labels from device "
+                      f"tree source '{dtb_path}'")
+            sys.exit(1)
+    else:
+        # The device tree is a blob file from the image.
+        try:
+            # About the 'sed' programs below:
+            #  -e 's/$/\"/' appends '"' to each line
+            subprocess.check_output(
+                f"set -o pipefail && fdtget {shlex.quote(dtb_path)} / compatible | tr ' ' '\n' "
+                f"| sed -e 's/$/\"/' >{shlex.quote(output_path)}",
+                shell=True, text=True, stderr=subprocess.STDOUT)
+        except subprocess.CalledProcessError as exc:
+            log.error(exc.output.strip())
+            if "FDT_ERR_BADMAGIC" in exc.output:
+                log.error(f"error: bad file format -- is '{dtb_path}' a device tree blob?")
+            else:
+                log.error("error: cannot extract compatibility labels from "
+                          f"device tree blob '{dtb_path}'")
+            sys.exit(1)
+
+
 def do_dto_list(args):
     '''Perform the 'dto list' command.'''
+    storage_dir = os.path.abspath(args.storage_directory)
 
     # Sanity check for overlay sources to scan.
     overlays_subdir = "device-trees/overlays"
@@ -156,34 +207,34 @@ def do_dto_list(args):
         sys.exit(1)
 
     # Sanity check for --device-tree
-    if args.device_tree and not (args.device_tree.endswith(".dtb") or
-                                 args.device_tree.endswith(".dts")):
+    device_tree_ext = os.path.splitext(args.device_tree)[1] if args.device_tree else None
+    if args.device_tree and device_tree_ext not in DEVICE_TREE_EXTENSIONS:
         log.error("Please pass either a device tree source file or device "
                   "tree binary to --device-tree.")
         sys.exit(1)
 
-    images_unpack_executed(args.storage_directory)
-    if unpacked_image_type(args.storage_directory) == "raw":
+    images_unpack_executed(storage_dir)
+    if unpacked_image_type(storage_dir) == "raw":
         raise InvalidDataError("dto commands are not supported for WIC/raw images. "
                                "Aborting.")
 
     # Find a device tree to check overlay compatibility against.
     dtb_path = args.device_tree
-    if dtb_path and not os.path.isfile(dtb_path) and dtb_path.endswith(".dts"):
+    if dtb_path and not os.path.isfile(dtb_path) and device_tree_ext == ".dts":
         # The user has passed a wrong device tree blob file with --device-tree
         log.error(f"error: cannot read device tree source '{dtb_path}'.")
         sys.exit(1)
     is_dtb_exact = True
-    if not dtb_path or dtb_path.endswith(".dtb"):
+    if not dtb_path:
         # The user has not issued --device-tree; take the applied device tree instead.
-        (dtb_path, is_dtb_exact) = dt.get_current_dtb_path(args.storage_directory)
+        (dtb_path, is_dtb_exact) = dt.get_current_dtb_path(storage_dir)
+    elif device_tree_ext == ".dtb":
+        dtb_path = dt.resolve_dtb_path(storage_dir, dtb_path)
     if not is_dtb_exact and not args.device_tree:
         log.error("Could not determine default device tree.")
-        dtb_list = subprocess.check_output(
-            ["find", os.path.dirname(dtb_path), "-maxdepth", "1", "-type", "f",
-             "-name", "*.dtb", "-printf", "- %f\\n"],
-            text=True).rstrip()
-        if dtb_list.count('\n') > 0:
+        dtb_basenames = dt.list_dtb_basenames(os.path.dirname(dtb_path))
+        dtb_list = "\n".join(f"- {name}" for name in dtb_basenames)
+        if len(dtb_basenames) > 1:
             log.error("Please use --device-tree to pass one of the device "
                       "trees below as the assumed default:")
             log.error(dtb_list)
@@ -191,8 +242,6 @@ def do_dto_list(args):
         else:
             log.info("Proceeding with the following device tree as the assumed default:")
             log.info(dtb_list)
-    if args.device_tree and args.device_tree.endswith(".dtb"):
-        dtb_path = os.path.join(os.path.dirname(dtb_path), args.device_tree)
 
     # Extract compatibility labels from the device tree blob,
     # and use them for building regexp patterns for matching with compatible
@@ -204,82 +253,50 @@ def do_dto_list(args):
     # ^[[:blank:]]*compatible *= *"fsl,imx8qxp"
     with tempfile.NamedTemporaryFile(delete=False) as tmpf:
         compat_regexps_tmp_path = tmpf.name
-    if args.device_tree and args.device_tree.endswith(".dts"):
-        # The user passed a device tree source file to check compatibility against;
-        # parse the textual content of the file.
+    try:
+        write_compat_regexps(dtb_path, device_tree_ext, compat_regexps_tmp_path)
+
+        # Show all device tree overlay source files that are compatible with the device tree blob.
+        # Given the regexp patterns mentioned above, 'grep' can easily scan for all compatible
+        # files under a given subdirectory.
         try:
-            # About the 'sed' invocations below:
-            # 1. The first 'sed' scans the device tree source file and extracts
-            #    the first block from "compatible =" to the semicolon.
-            # 2. The second sed filters out the "source noise" of the
-            #    compatibility values;
-            # 3. The final 'sed' prepends '^[[:blank:]]*compatible *= *'
-            #    to the compatibility values.
-            subprocess.check_output(
-                "set -o pipefail && "
-                "sed -r -e '/^[[:blank:]]*compatible *=/,/;/!d' "
-                f"-e '/;/q' {shlex.quote(dtb_path)} | tr -d '\n' | "
-                "sed -r -e 's/.*\\<compatible *= *//' "
-                "-e 's/[[:blank:]]*//g' -e 's/\";.*/\"\\n/' -e 's/\",\"/\"\\n\"/g'"
-                f">{shlex.quote(compat_regexps_tmp_path)}",
-                shell=True, text=True, stderr=subprocess.STDOUT)
-        except subprocess.CalledProcessError as exc:
-            log.error(exc.output.strip())
-            log.error("error: cannot extract compatibility labels from device "
-                      f"tree source '{dtb_path}'")
-            sys.exit(1)
-    else:
-        # The device tree is a blob file from the image.
+            compat_list = subprocess.check_output(
+                f"set -o pipefail && grep -rlHEf {shlex.quote(compat_regexps_tmp_path)} "
+                f"{shlex.quote(overlays_subdir)} "
+                "| sort -u | sed -e 's/^/- /'", shell=True, text=True).strip()
+            log.info(f"Overlays compatible with device tree {os.path.basename(dtb_path)}:\n"
+                     f"{compat_list}")
+        except: # pylint: disable=W0702
+            log.info("No overlays compatible with device tree "
+                     f"{os.path.basename(dtb_path)} were found.")
+    finally:
         try:
-            # About the 'sed' programs below:
-            #  -e 's/$/\"/' appends '"' to each line
-            subprocess.check_output(
-                f"set -o pipefail && fdtget {shlex.quote(dtb_path)} / compatible | tr ' ' '\n' "
-                f"| sed -e 's/$/\"/' >{shlex.quote(compat_regexps_tmp_path)}",
-                shell=True, text=True, stderr=subprocess.STDOUT)
-        except subprocess.CalledProcessError as exc:
-            log.error(exc.output.strip())
-            if "FDT_ERR_BADMAGIC" in exc.output:
-                log.error(f"error: bad file format -- is '{dtb_path}' a device tree blob?")
-            else:
-                log.error("error: cannot extract compatibility labels from "
-                          f"device tree blob '{dtb_path}'")
-            sys.exit(1)
-
-    # Show all device tree overlay source files that are compatible with the device tree blob.
-    # Given the regexp patterns mentioned above, 'grep' can easily scan for all compatible
-    # files under a given subdirectory.
-    try:
-        compat_list = subprocess.check_output(
-            f"set -o pipefail && grep -rlHEf {shlex.quote(compat_regexps_tmp_path)} "
-            f"{shlex.quote(overlays_subdir)} "
-            "| sort -u | sed -e 's/^/- /'", shell=True, text=True).strip()
-        log.info(f"Overlays compatible with device tree {os.path.basename(dtb_path)}:")
-        log.info(f"{compat_list}")
-    except: # pylint: disable=W0702
-        log.info("No overlays compatible with device tree "
-                 f"{os.path.basename(dtb_path)} were found.")
+            os.remove(compat_regexps_tmp_path)
+        except FileNotFoundError:
+            pass
 
 
 def do_dto_status(args):
     '''Perform the 'dto status' command.'''
+    storage_dir = os.path.abspath(args.storage_directory)
 
-    images_unpack_executed(args.storage_directory)
-    if unpacked_image_type(args.storage_directory) == "raw":
+    images_unpack_executed(storage_dir)
+    if unpacked_image_type(storage_dir) == "raw":
         raise InvalidDataError("dto commands are not supported for WIC/raw images. "
                                "Aborting.")
 
     # Show the enabled device tree.
-    (dtb_path, is_dtb_exact) = dt.get_current_dtb_path(args.storage_directory)
+    (dtb_path, is_dtb_exact) = dt.get_current_dtb_path(storage_dir)
     dtb_basename = os.path.basename(dtb_path)
     if is_dtb_exact:
-        log.info(f"Enabled overlays over device tree {dtb_basename}:")
+        lines = [f"Enabled overlays over device tree {dtb_basename}:"]
     else:
-        log.info("Enabled overlays over unknown device tree:")
+        lines = ["Enabled overlays over unknown device tree:"]
 
-    # Show the enabled overlays.
-    for overlay_basename in dto.get_applied_overlays_base_names(args.storage_directory):
-        log.info(f"- {overlay_basename}")
+    # Show the enabled overlays (as a single log record).
+    lines.extend(f"- {overlay_basename}"
+                 for overlay_basename in dto.get_applied_overlays_base_names(storage_dir))
+    log.info("\n".join(lines))
 
 
 def dto_remove_single(dtob_basename, storage_dir, presence_required=True):
@@ -337,8 +354,7 @@ def dto_remove_all(storage_dir):
         file.write("fdt_overlays=\n")
 
     # Wipe out all overlay blobs as external changes.
-    dtob_target_dir = os.path.join(
-        dt_changes_dir, dt.get_dtb_kernel_subdir(storage_dir), "overlays")
+    dtob_target_dir = dto.get_overlays_changes_dir(storage_dir)
     shutil.rmtree(dtob_target_dir, ignore_errors=True)
 
     # Sanity check.
@@ -349,13 +365,15 @@ def dto_remove_all(storage_dir):
 def do_dto_remove(args):
     '''Perform the 'dto status' command.'''
 
+    storage_dir = os.path.abspath(args.storage_directory)
+
     if args.all and args.dtob_basename:
         log.error("error: both --all and an overlay were specified in the command line.")
         sys.exit(1)
 
     if args.all:
         # The user wants to remove all overlays.
-        dto_remove_all(args.storage_directory)
+        dto_remove_all(storage_dir)
 
     else:
         # The user wants to remove a single overlay.
@@ -363,7 +381,7 @@ def do_dto_remove(args):
             log.error("error: no overlay was specified in the command line.")
             sys.exit(1)
 
-        dto_remove_single(args.dtob_basename, args.storage_directory, presence_required=True)
+        dto_remove_single(args.dtob_basename, storage_dir, presence_required=True)
 
 
 def do_dto_deploy(args):
@@ -53,7 +53,7 @@ def prepare_storage(storage_directory, remove_storage):
 
     # Main directories: will be cleared and returned by this function.
     main_dirs = [os.path.join(storage_dir, dirname)
-                 for dirname in ("tezi", "sysroot", "ostree-archive")]
+                 for dirname in ("tezi", "sysroot", common.OSTREE_ARCHIVE_DIRNAME)]
 
     # Extra directories: will be cleared but not returned.
     extra_dirs = get_extra_dirs(storage_dir, main_dirs)
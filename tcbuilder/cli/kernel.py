@@ -11,7 +11,8 @@ import subprocess
 
 from tcbuilder.errors import PathNotExistError
 from tcbuilder.errors import FileContentMissing, InvalidDataError
-from tcbuilder.backend.common import (get_tar_compress_program_options,
+from tcbuilder.backend.common import (get_ostree_archive_dir,
+                                      get_tar_compress_program_options,
                                       images_unpack_executed,
                                       unpacked_image_type,
                                       get_branch_and_major_from_metadata)
@@ -98,7 +99,7 @@ def kernel_build_module(source_dir, storage_dir, autoload):
          "-type", "d", "-name", "usr", "-print", "-quit"],
         text=True).rstrip()
     src_mod_dir = os.path.join(os.path.dirname(usr_dir), kernel_subdir)
-    src_ostree_archive_dir = os.path.join(storage_dir, "ostree-archive")
+    src_ostree_archive_dir = get_ostree_archive_dir(storage_dir)
 
     _, image_major_version = get_branch_and_major_from_metadata(storage_dir)
 
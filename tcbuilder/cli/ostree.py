@@ -7,7 +7,7 @@ import signal
 import subprocess
 
 from tcbuilder.backend import ostree
-from tcbuilder.backend.common import images_unpack_executed
+from tcbuilder.backend.common import get_ostree_archive_dir, images_unpack_executed
 
 log = logging.getLogger("torizon." + __name__)
 
@@ -21,7 +21,7 @@ def serve_ostree(storage_dir, repo_dir=None):
 
     if repo_dir is None:
         storage_dir_ = os.path.abspath(storage_dir)
-        src_ostree_archive_dir = os.path.join(storage_dir_, "ostree-archive")
+        src_ostree_archive_dir = get_ostree_archive_dir(storage_dir_)
         images_unpack_executed(storage_dir_)
         summary_cmd = ['ostree', 'summary', '--repo', src_ostree_archive_dir, '-u']
         subprocess.check_output(summary_cmd, stderr=subprocess.STDOUT)
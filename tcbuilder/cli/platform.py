@@ -582,7 +582,7 @@ def do_platform_push(args):
         if args.ostree is not None:
             src_ostree_archive_dir = os.path.abspath(args.ostree)
         else:
-            src_ostree_archive_dir = os.path.join(storage_dir, "ostree-archive")
+            src_ostree_archive_dir = common.get_ostree_archive_dir(storage_dir)
 
         if not os.path.exists(storage_dir):
             raise PathNotExistError(f"{storage_dir} does not exist")
@@ -9,7 +9,7 @@ import logging
 
 from tcbuilder.errors import PathNotExistError, InvalidArgumentError
 from tcbuilder.backend import splash as sbe
-from tcbuilder.backend.common import images_unpack_executed
+from tcbuilder.backend.common import get_ostree_archive_dir, images_unpack_executed
 
 log = logging.getLogger("torizon." + __name__)  # use name hierarchy for "main" to be the parent
 
@@ -34,7 +34,7 @@ def splash(splash_image, storage_dir):
     if not os.path.exists(splash_image):
         raise PathNotExistError(f"Unable to find splash image {splash_image}")
 
-    src_ostree_archive_dir = os.path.join(storage_dir, "ostree-archive")
+    src_ostree_archive_dir = get_ostree_archive_dir(storage_dir)
 
     sbe.create_splash_initramfs(work_dir, splash_image, src_ostree_archive_dir)
     log.info("splash screen merged to initramfs")
@@ -13,7 +13,7 @@ import shutil
 
 from tcbuilder.backend import union as ub
 from tcbuilder.errors import PathNotExistError, InvalidArgumentError
-from tcbuilder.backend.common import images_unpack_executed
+from tcbuilder.backend.common import get_ostree_archive_dir, images_unpack_executed
 
 log = logging.getLogger("torizon." + __name__)
 
@@ -214,7 +214,7 @@ def union(changes_dirs, storage_dir, union_branch,
         os.mkdir(temp_dir_extra)
         check_and_append_dirs(changes_dirs_, changes_dirs, temp_dir_extra)
 
-    src_ostree_archive_dir = os.path.join(storage_dir_, "ostree-archive")
+    src_ostree_archive_dir = get_ostree_archive_dir(storage_dir_)
     dirs_labels = make_dirs_labels(changes_dirs_, storage_dir_, temp_dir_extra)
 
     # Callback to show the label when backend is about to apply it:
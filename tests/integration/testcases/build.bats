@@ -149,7 +149,7 @@ teardown_file() {
     assert_output --partial '"releasenotes": "release-notes-fc.html"'
 
     # Check presence of container:
-    run [ -e "$OUTDIR/docker-storage.tar.xz" -a -e "$OUTDIR/docker-compose.yml" ]
+    run [ -e "$OUTDIR/docker-storage.tar.zst" -a -e "$OUTDIR/docker-compose.yml" ]
     assert_success
 
     # Check the ostree branch ref-binding:
@@ -189,7 +189,7 @@ teardown_file() {
     assert_output --partial '"releasenotes": "release-notes-fc.html"'
 
     # Check presence of container:
-    run [ -e "$OUTDIR/docker-storage.tar.xz" -a -e "$OUTDIR/docker-compose.yml" ]
+    run [ -e "$OUTDIR/docker-storage.tar.zst" -a -e "$OUTDIR/docker-compose.yml" ]
     assert_success
 
     # Deploy custom image.
@@ -394,7 +394,7 @@ teardown_file() {
     fi
 
     # Check presence of container:
-    run [ -e "$OUTDIR/docker-storage.tar.xz" -a -e "$OUTDIR/docker-compose.yml" ]
+    run [ -e "$OUTDIR/docker-storage.tar.zst" -a -e "$OUTDIR/docker-compose.yml" ]
     assert_success
     rm -fr "$OUTDIR"
 }
@@ -440,7 +440,7 @@ teardown_file() {
     assert_output --partial "Attempting to log in to"
 
     # Check presence of container:
-    run [ -e "${OUTDIR}/docker-storage.tar.xz" -a -e "${OUTDIR}/docker-compose.yml" ]
+    run [ -e "${OUTDIR}/docker-storage.tar.zst" -a -e "${OUTDIR}/docker-compose.yml" ]
     assert_success
     rm -fr "$OUTDIR"
 }
@@ -152,7 +152,7 @@ load 'lib/common.bash'
 
     run ls -l bundle/$COMPOSE
     assert_success
-    run ls -l bundle/docker-storage.tar.xz
+    run ls -l bundle/docker-storage.tar.zst
     assert_success
 
     rm -f "$COMPOSE"
@@ -176,11 +176,11 @@ load 'lib/common.bash'
 
     run ls -l $BUNDLE_DIR/$COMPOSE
     assert_success
-    run ls -l $BUNDLE_DIR/docker-storage.tar.xz
+    run ls -l $BUNDLE_DIR/docker-storage.tar.zst
     assert_success
 
     check-file-ownership-as-workdir "$BUNDLE_DIR"
-    check-file-ownership-as-workdir "$BUNDLE_DIR/docker-storage.tar.xz"
+    check-file-ownership-as-workdir "$BUNDLE_DIR/docker-storage.tar.zst"
 
     rm -f "$COMPOSE"
     rm -rf "$BUNDLE_DIR"
@@ -204,7 +204,7 @@ load 'lib/common.bash'
 
     run ls -l bundle/$COMPOSE
     assert_success
-    run ls -l bundle/docker-storage.tar.xz
+    run ls -l bundle/docker-storage.tar.zst
     assert_success
 
     run cat bundle/$COMPOSE
@@ -224,7 +224,7 @@ load 'lib/common.bash'
 
     run ls -l bundle/$COMPOSE
     assert_success
-    run ls -l bundle/docker-storage.tar.xz
+    run ls -l bundle/docker-storage.tar.zst
     assert_success
 
     run cat bundle/$COMPOSE